@@ -1,9 +1,29 @@
+import tkthread; tkthread.patch()  # must run before tkinter is imported, so worker threads can call root.after
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import threading
-import queue
-from online_search import search_arxiv
-from llm_handler import expand_query_with_llm, rerank_papers_with_llm
+from concurrent.futures import Future
+from online_search import search_arxiv, stream_terms
+from llm_handler import expand_query_with_llm, RerankStream
+
+def run_in_background(func, *args):
+    """
+    Runs func(*args) on a daemon thread and returns a Future for its result.
+
+    Unlike ThreadPoolExecutor workers, daemon threads are not joined at interpreter
+    exit, so closing the window doesn't wait for an in-flight LLM or arXiv call.
+    """
+    future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
 
 class SearchApp:
     def __init__(self, root):
@@ -15,8 +35,12 @@ class SearchApp:
         self.keyword_vars = []
         self.create_widgets()
 
-        # --- Threading and Queue for non-blocking search ---
-        self.ui_queue = queue.Queue()
+        # Only touched on the Tcl main thread: set while an expansion or search is running
+        self._busy = False
+        self._speculative_query = None
+        self._speculative_future = None
+        self._closing = False
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def create_widgets(self):
         # --- Main Frames ---
@@ -53,6 +77,10 @@ class SearchApp:
         # --- Results Text Area ---
         self.results_text = scrolledtext.ScrolledText(results_frame, wrap=tk.WORD, font=("Segoe UI", 10))
         self.results_text.pack(fill=tk.BOTH, expand=True)
+        self.results_text.tag_config('h1', font=('Segoe UI', 14, 'bold'))
+        self.results_text.tag_config('h2', font=('Segoe UI', 11, 'bold'))
+        self.results_text.tag_config('bold', font=('Segoe UI', 10, 'bold'))
+        self.results_text.tag_config('error', font=('Segoe UI', 10, 'bold'), foreground='red')
         self.results_text.config(state='disabled')
 
         # --- Status Bar ---
@@ -61,10 +89,31 @@ class SearchApp:
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, padding="5")
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
+    def on_close(self):
+        # Background work runs on daemon threads, so it doesn't keep the process
+        # alive; until exit it must stop scheduling UI updates (see post_to_ui)
+        self._closing = True
+        self.root.destroy()
+
+    def post_to_ui(self, func, *args):
+        """Schedules func(*args) on the Tcl main loop; safe to call from any thread."""
+        if self._closing:
+            return
+        try:
+            self.root.after(0, func, *args)
+        except (RuntimeError, tk.TclError):
+            # The window was closed between the check above and the call
+            pass
+
     def start_expansion(self, event=None):
         query = self.query_entry.get().strip()
         if not query:
             return
+        # The <Return> binding bypasses the disabled Expand button, so ignore
+        # presses while an expansion or search is still running
+        if self._busy:
+            return
+        self._busy = True
         
         self.expand_button.config(state="disabled")
         self.search_button.config(state="disabled")
@@ -74,94 +123,90 @@ class SearchApp:
             widget.destroy()
         self.keyword_vars.clear()
         
-        threading.Thread(target=self.run_expansion_thread, args=(query,), daemon=True).start()
-        self.root.after(100, self.check_queue)
-
-    def run_expansion_thread(self, query):
+        future = run_in_background(expand_query_with_llm, query)
+        # The original query is always one of the search terms, so start fetching it
+        # from arXiv while the LLM is still expanding
+        self._speculative_query = query
+        self._speculative_future = run_in_background(search_arxiv, query, 5)
+        # Done-callbacks fire on the worker thread; after(0, ...) hands the result to the Tcl main loop
+        future.add_done_callback(lambda f: self.post_to_ui(self._on_expansion_done, f))
+
+    def _on_expansion_done(self, future):
         try:
-            expanded_terms = expand_query_with_llm(query)
-            self.ui_queue.put({"type": "keywords", "data": expanded_terms})
+            expanded_terms = future.result()
         except Exception as e:
-            self.ui_queue.put({"type": "error", "data": f"Failed to expand query: {e}"})
+            self.show_error(f"Failed to expand query: {e}")
+            return
+
+        self.display_keywords(expanded_terms)
+        self.status_var.set("✅ Expansion complete. Select terms and click Search.")
+        self.set_idle()
 
     def start_search(self, event=None):
+        if self._busy:
+            return
         selected_keywords = [var.get() for var in self.keyword_vars if var.get()]
         if not selected_keywords:
-            self.update_status("⚠️ Please select at least one search term.")
+            self.status_var.set("⚠️ Please select at least one search term.")
             return
 
         query = self.query_entry.get().strip()
         top_n = self.top_n_var.get()
         
+        self._busy = True
         self.search_button.config(state='disabled')
         self.expand_button.config(state='disabled')
         self.results_text.config(state='normal')
         self.results_text.delete(1.0, tk.END)
         self.results_text.config(state='disabled')
         
-        threading.Thread(target=self.run_search_thread, args=(query, selected_keywords, top_n), daemon=True).start()
-        self.root.after(100, self.check_queue)
-
-    def run_search_thread(self, query, search_terms, top_n):
+        future = run_in_background(self._do_search, query, selected_keywords, top_n)
+        future.add_done_callback(lambda f: self.post_to_ui(self._on_search_done, f, top_n))
+
+    def _do_search(self, query, search_terms, top_n):
+        """Runs on a worker thread; returns the re-ranked candidate papers."""
+        self.post_to_ui(self.status_var.set, f"📚 Gathering and re-ranking papers for {len(search_terms)} terms...")
+        reranker = RerankStream(query, top_n)
+        overrides = {}
+        if self._speculative_future is not None:
+            # Already fetched (or in flight) since the expansion started; search_arxiv
+            # returns [] on failure, in which case the term is fetched again
+            overrides[self._speculative_query] = self._speculative_future.result
+
+        # Fetch 5 per term to build a good candidate pool; papers are handed to
+        # the re-ranker as soon as each page arrives
+        n_papers = stream_terms(
+            search_terms, 5, reranker.submit, overrides,
+            on_fetched=lambda term, i: self.post_to_ui(
+                self.status_var.set, f"📚 Fetched '{term}' ({i}/{len(search_terms)})..."))
+
+        self.post_to_ui(self.status_var.set, f"🔍 Re-ranking {n_papers} papers with LLM...")
+        return reranker.results()
+
+    def _on_search_done(self, future, top_n):
         try:
-            self.update_status_in_thread(f"📚 Gathering papers for {len(search_terms)} terms...")
-            candidate_papers = []
-            seen_titles = set()
-            for i, term in enumerate(search_terms):
-                self.update_status_in_thread(f"📚 Searching for '{term}' ({i+1}/{len(search_terms)})...")
-                papers = search_arxiv(term, max_results=5) # Fetch 5 per term to build a good candidate pool
-                for paper in papers:
-                    if paper['title'] not in seen_titles:
-                        candidate_papers.append(paper)
-                        seen_titles.add(paper['title'])
-            
-            if not candidate_papers:
-                self.ui_queue.put({"type": "error", "data": "No papers found. Please try a different query."})
-                return
-
-            self.update_status_in_thread(f"🔍 Re-ranking {len(candidate_papers)} papers with LLM...")
-            reranked_papers = rerank_papers_with_llm(candidate_papers, query)
-            
-            self.ui_queue.put({"type": "results", "data": (reranked_papers, top_n)})
-
+            reranked_papers = future.result()
         except Exception as e:
-            self.ui_queue.put({"type": "error", "data": f"An unexpected error occurred: {e}"})
+            self.show_error(f"An unexpected error occurred: {e}")
+            return
 
-    def update_status_in_thread(self, message):
-        self.ui_queue.put({"type": "status", "data": message})
+        if not reranked_papers:
+            self.show_error("No papers found. Please try a different query.")
+            return
 
-    def check_queue(self):
-        try:
-            message = self.ui_queue.get_nowait()
-            msg_type = message.get("type")
-            msg_data = message.get("data")
-
-            if msg_type == "status":
-                self.status_var.set(msg_data)
-            elif msg_type == "keywords":
-                self.display_keywords(msg_data)
-                self.status_var.set("✅ Expansion complete. Select terms and click Search.")
-                self.expand_button.config(state='normal')
-                self.search_button.config(state='normal')
-                return 
-            elif msg_type == "results":
-                reranked_papers, top_n = msg_data
-                self.display_results(reranked_papers, top_n)
-                self.status_var.set("✅ Done!")
-                self.expand_button.config(state='normal')
-                self.search_button.config(state='normal')
-                return
-            elif msg_type == "error":
-                self.display_error(msg_data)
-                self.status_var.set("❌ Error!")
-                self.expand_button.config(state='normal')
-                self.search_button.config(state='normal')
-                return
-
-        except queue.Empty:
-            pass
-        
-        self.root.after(100, self.check_queue)
+        self.display_results(reranked_papers, top_n)
+        self.status_var.set("✅ Done!")
+        self.set_idle()
+
+    def show_error(self, error_message):
+        self.display_error(error_message)
+        self.status_var.set("❌ Error!")
+        self.set_idle()
+
+    def set_idle(self):
+        self._busy = False
+        self.expand_button.config(state='normal')
+        self.search_button.config(state='normal')
 
     def display_keywords(self, keywords):
         for keyword in keywords:
@@ -174,24 +219,27 @@ class SearchApp:
         self.results_text.config(state='normal')
         self.results_text.delete(1.0, tk.END)
         
+        # Tk's insert accepts alternating (chars, tags) pairs, so the whole render
+        # is a single Tcl call instead of one per line
+        segments = []
         for i, paper in enumerate(papers[:top_n], 1):
-            self.results_text.insert(tk.END, f"--- RANK {i} ---\n", ('h1',))
-            self.results_text.insert(tk.END, f"📄 Title: {paper['title']}\n", ('h2',))
-            self.results_text.insert(tk.END, f"👥 Authors: {', '.join(paper['authors'])}\n")
-            self.results_text.insert(tk.END, f"🔗 PDF Link: {paper['pdf_url']}\n")
-            self.results_text.insert(tk.END, f"⭐ LLM Score: {paper.get('relevance_score', 'N/A')}/10\n", ('bold',))
-            self.results_text.insert(tk.END, f"💬 Justification: {paper.get('justification', 'N/A')}\n\n")
+            segments += [
+                f"--- RANK {i} ---\n", ('h1',),
+                f"📄 Title: {paper['title']}\n", ('h2',),
+                f"👥 Authors: {', '.join(paper['authors'])}\n", (),
+                f"🔗 PDF Link: {paper['pdf_url']}\n", (),
+                f"⭐ LLM Score: {paper.get('relevance_score', 'N/A')}/10\n", ('bold',),
+                f"💬 Justification: {paper.get('justification', 'N/A')}\n\n", ()
+            ]
+        if segments:
+            self.results_text.insert(tk.END, *segments)
 
-        self.results_text.tag_config('h1', font=('Segoe UI', 14, 'bold'))
-        self.results_text.tag_config('h2', font=('Segoe UI', 11, 'bold'))
-        self.results_text.tag_config('bold', font=('Segoe UI', 10, 'bold'))
         self.results_text.config(state='disabled')
         
     def display_error(self, error_message):
         self.results_text.config(state='normal')
         self.results_text.delete(1.0, tk.END)
         self.results_text.insert(tk.END, f"An error occurred:\n\n{error_message}", ('error',))
-        self.results_text.tag_config('error', font=('Segoe UI', 10, 'bold'), foreground='red')
         self.results_text.config(state='disabled')
 
 if __name__ == '__main__':
@@ -1,33 +1,143 @@
 import os
-from typing import List, Dict
+import time
+import asyncio
+import functools
+import threading
+import httpx
+import diskcache
+from typing import List, Dict, Tuple, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import CommaSeparatedListOutputParser, JsonOutputParser
-from pydantic.v1 import BaseModel, Field
+from langchain_core.output_parsers import CommaSeparatedListOutputParser
+from pydantic import BaseModel, Field
+from openai import RateLimitError, APIConnectionError, InternalServerError
+from tenacity import retry, wait_exponential_jitter, stop_after_attempt, stop_after_delay, retry_if_exception_type
 
 # --- 1. LLM and Output Parsers Initialization ---
 
-# Initialize the LLM. We'll use GPT-3.5 Turbo for its speed and cost-effectiveness.
+# Per-attempt request timeout, and the time after which no further retries are started.
+# Worst case a call gives up after roughly LLM_RETRY_DEADLINE_SECONDS + LLM_TIMEOUT_SECONDS.
+LLM_TIMEOUT_SECONDS = 30
+LLM_RETRY_DEADLINE_SECONDS = 60
+
+# Initialize the LLM. We'll use GPT-4o mini for its speed, cost-effectiveness and
+# native structured-output support.
 # The model will read the OPENAI_API_KEY from your environment variables.
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+# A single long-lived client is shared by every call, with a connection pool sized
+# so the concurrent re-ranking fan-out isn't throttled by the default pool.
+llm = ChatOpenAI(
+    model="gpt-4o-mini",
+    temperature=0,
+    max_retries=0,
+    timeout=LLM_TIMEOUT_SECONDS,
+    http_async_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+    )
+)
+
+# The async client's pooled connections are bound to the event loop that opened them,
+# so all async LLM work from synchronous callers runs on one persistent background loop.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+
+# Transient API failures (rate limits, dropped connections, 5xx) are retried with
+# jittered exponential backoff; anything else fails immediately. This is the only
+# retry layer around LLM calls (the client above has max_retries=0), so an exception
+# that escapes it is final and callers fall back straight away.
+_llm_retry = retry(
+    wait=wait_exponential_jitter(1, 20),
+    stop=stop_after_attempt(4) | stop_after_delay(LLM_RETRY_DEADLINE_SECONDS),
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError, TimeoutError)),
+    reraise=True
+)
+
+@_llm_retry
+def _invoke_with_retry(runnable, inputs):
+    return runnable.invoke(inputs)
+
+@_llm_retry
+async def _ainvoke_with_retry(runnable, inputs):
+    return await runnable.ainvoke(inputs)
 
 # Define the desired output structure for query expansion
 list_parser = CommaSeparatedListOutputParser()
 
-# Define the desired Pydantic output structure for re-ranking
-class PaperRanking(BaseModel):
+# Define the desired Pydantic output structure for re-ranking.
+# Several papers are scored in one call, so the model returns one item per paper.
+class PaperRankingItem(BaseModel):
+    index: int = Field(description="The bracketed index of the paper being scored.")
     relevance_score: int = Field(description="A score from 1 to 10 indicating the paper's relevance to the user's query.")
     justification: str = Field(description="A brief, one-sentence justification for the assigned score.")
-    
-# Create a JSON output parser from the Pydantic model
-json_parser = JsonOutputParser(pydantic_object=PaperRanking)
+
+class PaperBatchRanking(BaseModel):
+    rankings: List[PaperRankingItem] = Field(description="One ranking entry for every paper in the batch.")
+
+# The cheap first re-ranking pass only asks for a score, without a justification
+class PaperCoarseScore(BaseModel):
+    index: int = Field(description="The bracketed index of the paper being scored.")
+    relevance_score: int = Field(description="A score from 1 to 10 indicating the paper's relevance to the user's query.")
+
+class PaperCoarseBatch(BaseModel):
+    scores: List[PaperCoarseScore] = Field(description="One score entry for every paper in the batch.")
+
+# Bind the ranking schemas to the model via OpenAI's native structured outputs, so
+# responses are always well-formed and validated straight into the Pydantic models.
+# The method is explicit because langchain-openai's default has changed over time.
+ranking_llm = llm.with_structured_output(PaperBatchRanking, method="json_schema")
+coarse_llm = llm.with_structured_output(PaperCoarseBatch, method="json_schema")
 
 # --- 2. Query Expansion Function ---
 
+# Expansions are persisted across restarts for a week
+EXPANSION_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+_expansion_cache = diskcache.Cache(os.path.expanduser("~/.cache/llm_expand"))
+
+expansion_prompt_template = """
+You are an expert research assistant in computer science. A user has provided the following query: "{query}".
+Your task is to generate a list of 5-7 related technical keywords, alternative phrasings, or underlying concepts
+that would be useful for searching academic databases like arXiv.
+
+For example, if the query is "inference time timbre-transfer", you might suggest:
+"real-time voice conversion", "audio style transfer", "SDEdit for audio generation", "GAN inversion audio", "voice cloning".
+
+{format_instructions}
+"""
+
+_expand_prompt = PromptTemplate(
+    template=expansion_prompt_template,
+    input_variables=["query"],
+    partial_variables={"format_instructions": list_parser.get_format_instructions()}
+)
+
+_EXPAND_CHAIN = _expand_prompt | llm | list_parser
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+@functools.lru_cache(maxsize=512)
+def _expand_cached(normalized_query: str, query: str) -> Tuple[str, ...]:
+    """
+    Expands a query, consulting the on-disk cache (keyed by the normalized query)
+    before calling the LLM with the query as the user typed it, so acronyms and
+    model names keep their casing. Exceptions propagate so that failed expansions
+    are never cached.
+    """
+    cached = _expansion_cache.get(normalized_query)
+    if cached is not None:
+        ts, data = cached
+        if time.time() - ts < EXPANSION_CACHE_TTL_SECONDS:
+            return data
+
+    expanded_terms = tuple(_invoke_with_retry(_EXPAND_CHAIN, {"query": query}))
+    _expansion_cache[normalized_query] = (time.time(), expanded_terms)
+    return expanded_terms
+
 def expand_query_with_llm(query: str) -> List[str]:
     """
     Uses an LLM to expand a user's query into a list of related search terms.
 
+    Results are cached by the case- and whitespace-normalized query.
+
     Args:
         query (str): The user's original search query.
 
@@ -35,32 +145,20 @@ def expand_query_with_llm(query: str) -> List[str]:
         List[str]: A list of related search terms, including the original query.
     """
     try:
-        expansion_prompt_template = """
-        You are an expert research assistant in computer science. A user has provided the following query: "{query}".
-        Your task is to generate a list of 5-7 related technical keywords, alternative phrasings, or underlying concepts
-        that would be useful for searching academic databases like arXiv.
+        expanded_terms = _expand_cached(_normalize_query(query), query)
         
-        For example, if the query is "inference time timbre-transfer", you might suggest:
-        "real-time voice conversion", "audio style transfer", "SDEdit for audio generation", "GAN inversion audio", "voice cloning".
-
-        {format_instructions}
-        """
-        
-        prompt = PromptTemplate(
-            template=expansion_prompt_template,
-            input_variables=["query"],
-            partial_variables={"format_instructions": list_parser.get_format_instructions()}
-        )
-        
-        chain = prompt | llm | list_parser
-        
-        expanded_terms = chain.invoke({"query": query})
-        
-        # Ensure the original query is always included
-        if query not in expanded_terms:
-            expanded_terms.insert(0, query)
+        # Ensure the original query is always included, and drop terms that only differ
+        # in case or spacing (e.g. the model echoing the query back lowercased), since
+        # each one would cost a separate arXiv fetch
+        terms = []
+        seen = set()
+        for term in (query, *expanded_terms):
+            key = _normalize_query(term)
+            if key not in seen:
+                seen.add(key)
+                terms.append(term)
             
-        return expanded_terms
+        return terms
 
     except Exception as e:
         print(f"An error occurred during query expansion: {e}")
@@ -69,10 +167,169 @@ def expand_query_with_llm(query: str) -> List[str]:
 
 # --- 3. Re-ranking Function ---
 
+# Maximum number of re-ranking requests allowed in flight at once
+RERANK_CONCURRENCY = 10
+
+# Number of papers scored per LLM call. Latency grows with batch size, so keep this small.
+RERANK_BATCH_SIZE = 5
+
+# Abstracts are truncated to roughly 150 tokens, which is ample context for relevance
+# scoring and keeps prompt length (and so cost and latency) bounded
+MAX_ABSTRACT_CHARS = 900
+
+# The coarse pass packs many papers into one short-prompt call; only the best
+# COARSE_KEEP_FACTOR * top_n papers then go through the full re-ranking prompt, once.
+# For example, with top_n=5 a pool of 35 candidates costs 2 coarse + 2 full calls
+# instead of 7 full calls (and 50 candidates cost 5 instead of 10).
+COARSE_BATCH_SIZE = 20
+COARSE_ABSTRACT_CHARS = 300
+COARSE_KEEP_FACTOR = 2
+
+rerank_prompt_template = """
+You are an expert research assistant. A user is searching for papers related to: "{query}".
+
+Please evaluate each of the following academic papers based on its title and abstract. Your task is to determine how relevant each one is to the user's query.
+
+{papers_block}
+
+For every paper, provide a relevance score from 1 (not relevant at all) to 10 (highly relevant),
+along with a brief, one-sentence justification for your score. Refer to each paper by its bracketed index.
+"""
+
+coarse_prompt_template = """
+You are an expert research assistant. A user is searching for papers related to: "{query}".
+
+Rate how relevant each of the following papers is to the user's query, from 1 (not relevant at all)
+to 10 (highly relevant). Refer to each paper by its bracketed index.
+
+{papers_block}
+"""
+
+def _shrink(abstract: str, max_chars: int = MAX_ABSTRACT_CHARS) -> str:
+    """Clips an abstract to at most max_chars, cutting at the last sentence boundary."""
+    abstract = " ".join(abstract.split())
+    if len(abstract) <= max_chars:
+        return abstract
+    clipped = abstract[:max_chars]
+    if ". " in clipped:
+        return clipped.rsplit(". ", 1)[0] + "."
+    return clipped
+
+def _format_papers_block(chunk: List[Dict], max_chars: int = MAX_ABSTRACT_CHARS) -> str:
+    return "\n\n".join(
+        f"[{i}] Title: {paper['title']}\nAbstract: {_shrink(paper['summary'], max_chars)}"
+        for i, paper in enumerate(chunk)
+    )
+
+async def _score_batch(chunk: List[Dict], query: str, sem: asyncio.Semaphore) -> List[Dict]:
+    """
+    Scores one batch of papers with a single LLM call and writes the
+    'relevance_score' and 'justification' fields onto each paper.
+    """
+    try:
+        async with sem:
+            # The prompt is a plain str.format template, so there is no PromptTemplate
+            # validation or rendering in the hot path
+            result = await _ainvoke_with_retry(ranking_llm, rerank_prompt_template.format(
+                query=query,
+                papers_block=_format_papers_block(chunk)
+            ))
+    except Exception as e:
+        print(f"Could not rank a batch of {len(chunk)} papers: {e}")
+        result = PaperBatchRanking(rankings=[])
+
+    # Scatter the batch rankings back onto their papers by index
+    rankings = {item.index: item for item in result.rankings}
+    for i, paper in enumerate(chunk):
+        ranking = rankings.get(i)
+        if ranking is None:
+            # Assign a default low score if the paper could not be ranked
+            ranking = PaperRankingItem(index=i, relevance_score=0, justification="Failed to analyze.")
+        
+        # Add the LLM's ranking to the paper dictionary
+        paper.update({
+            "relevance_score": ranking.relevance_score,
+            "justification": ranking.justification
+        })
+    return chunk
+
+async def _coarse_score_batch(chunk: List[Dict], query: str, sem: asyncio.Semaphore) -> List[Dict]:
+    """
+    Scores one batch of papers with the short, score-only prompt and writes a
+    'coarse_score' field onto each paper (None if the paper could not be scored).
+    """
+    try:
+        async with sem:
+            result = await _ainvoke_with_retry(coarse_llm, coarse_prompt_template.format(
+                query=query,
+                papers_block=_format_papers_block(chunk, COARSE_ABSTRACT_CHARS)
+            ))
+    except Exception as e:
+        print(f"Could not coarse-rank a batch of {len(chunk)} papers: {e}")
+        result = PaperCoarseBatch(scores=[])
+
+    scores = {item.index: item.relevance_score for item in result.scores}
+    for i, paper in enumerate(chunk):
+        paper["coarse_score"] = scores.get(i)
+    return chunk
+
+async def _arefine(candidates: List[Dict], query: str, top_n: int) -> List[Dict]:
+    """
+    Completes the two-pass cascade once every candidate has a coarse score.
+
+    The best COARSE_KEEP_FACTOR * top_n candidates by coarse score are re-scored with
+    the full prompt, as are any the coarse pass failed to score, so a failed coarse
+    call never silently drops candidates. The rest keep their coarse score and are
+    ranked after every fully scored paper, since the two prompts' scores are not
+    directly comparable.
+    """
+    keep = COARSE_KEEP_FACTOR * top_n
+    unscored = [paper for paper in candidates if paper["coarse_score"] is None]
+    ranked = sorted(
+        [paper for paper in candidates if paper["coarse_score"] is not None],
+        key=lambda x: x["coarse_score"], reverse=True
+    )
+    refined = await arerank_papers_with_llm(unscored + ranked[:keep], query)
+    coarse_only = ranked[keep:]
+    for paper in coarse_only:
+        paper.update({
+            "relevance_score": paper["coarse_score"],
+            "justification": "Scored in the coarse pass only."
+        })
+    return refined + coarse_only
+
+def _sort_by_score(batches: List[List[Dict]]) -> List[Dict]:
+    reranked_papers = [paper for batch in batches for paper in batch]
+    # Sort papers by the new relevance score, descending
+    return sorted(reranked_papers, key=lambda x: x["relevance_score"], reverse=True)
+
+async def arerank_papers_with_llm(papers: List[Dict], query: str) -> List[Dict]:
+    """
+    Asynchronously scores and re-ranks a list of papers.
+
+    Papers are grouped into batches of RERANK_BATCH_SIZE, each batch is scored with a
+    single LLM call, and the batches are issued concurrently.
+
+    Args:
+        papers (List[Dict]): A list of paper dictionaries from search_arxiv.
+        query (str): The user's original search query.
+
+    Returns:
+        List[Dict]: The list of papers, with added 'relevance_score' and 'justification' fields,
+                    sorted by relevance score in descending order.
+    """
+    sem = asyncio.Semaphore(RERANK_CONCURRENCY)
+    chunks = [papers[i:i + RERANK_BATCH_SIZE] for i in range(0, len(papers), RERANK_BATCH_SIZE)]
+    batches = await asyncio.gather(*[_score_batch(chunk, query, sem) for chunk in chunks])
+    return _sort_by_score(batches)
+
 def rerank_papers_with_llm(papers: List[Dict], query: str) -> List[Dict]:
     """
     Uses an LLM to score and re-rank a list of papers based on a user's query.
 
+    This is a blocking wrapper around arerank_papers_with_llm for use from
+    synchronous code (the CLI and the UI worker threads).
+
     Args:
         papers (List[Dict]): A list of paper dictionaries from search_arxiv.
         query (str): The user's original search query.
@@ -81,51 +338,70 @@ def rerank_papers_with_llm(papers: List[Dict], query: str) -> List[Dict]:
         List[Dict]: The list of papers, with added 'relevance_score' and 'justification' fields,
                     sorted by relevance score in descending order.
     """
-    reranked_papers = []
-    
-    rerank_prompt_template = """
-    You are an expert research assistant. A user is searching for papers related to: "{query}".
-    
-    Please evaluate the following academic paper based on its title and abstract. Your task is to determine how relevant it is to the user's query.
-    
-    Title: {paper_title}
-    Abstract: {paper_abstract}
-    
-    Provide a relevance score from 1 (not relevant at all) to 10 (highly relevant).
-    Also, provide a brief, one-sentence justification for your score.
+    return asyncio.run_coroutine_threadsafe(arerank_papers_with_llm(papers, query), _loop).result()
 
-    {format_instructions}
+class RerankStream:
     """
-    
-    prompt = PromptTemplate(
-        template=rerank_prompt_template,
-        input_variables=["query", "paper_title", "paper_abstract"],
-        partial_variables={"format_instructions": json_parser.get_format_instructions()}
-    )
-    
-    chain = prompt | llm | json_parser
-    
-    for paper in papers:
-        try:
-            ranking = chain.invoke({
-                "query": query,
-                "paper_title": paper["title"],
-                "paper_abstract": paper["summary"]
-            })
-            
-            # Add the LLM's ranking to the paper dictionary
-            paper.update(ranking)
-            reranked_papers.append(paper)
-            
-        except Exception as e:
-            print(f"Could not rank paper '{paper['title']}': {e}")
-            # Optionally, assign a default low score if ranking fails
-            paper.update({"relevance_score": 0, "justification": "Failed to analyze."})
-            reranked_papers.append(paper)
-            
-    # Sort papers by the new relevance score, descending
-    return sorted(reranked_papers, key=lambda x: x["relevance_score"], reverse=True)
+    Re-ranks papers as they arrive instead of waiting for the full candidate pool.
+
+    Producer threads call submit() for each paper; a consumer on the shared event loop
+    fires a scoring call as soon as a batch has queued up, so LLM round trips overlap
+    with the remaining arXiv fetches. Call results() once all producers are done.
+
+    If top_n is given, papers are instead coarse-scored in batches of COARSE_BATCH_SIZE
+    as they arrive, and only the best COARSE_KEEP_FACTOR * top_n go through the full
+    prompt at the end. Pools no larger than that would be refined entirely anyway, so
+    they are held back and sent straight to the full prompt without a coarse pass.
+    """
+
+    def __init__(self, query: str, top_n: Optional[int] = None):
+        self.query = query
+        self.top_n = top_n
+        self._queue = asyncio.Queue()
+        self._future = asyncio.run_coroutine_threadsafe(self._consume(), _loop)
+
+    def submit(self, paper: Dict):
+        """Queues a paper for re-ranking. Safe to call from any thread."""
+        _loop.call_soon_threadsafe(self._queue.put_nowait, paper)
+
+    def results(self) -> List[Dict]:
+        """Waits for every submitted paper to be scored and returns them sorted by relevance."""
+        _loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        return self._future.result()
+
+    async def _consume(self) -> List[Dict]:
+        keep = None if self.top_n is None else COARSE_KEEP_FACTOR * self.top_n
+        sem = asyncio.Semaphore(RERANK_CONCURRENCY)
+        batch_size, score_batch = RERANK_BATCH_SIZE, _score_batch
+        tasks, chunk, held = [], [], []
+        coarse = False
+        while True:
+            paper = await self._queue.get()
+            if paper is None:
+                break
+            if keep is not None and not coarse:
+                held.append(paper)
+                if len(held) <= keep:
+                    continue
+                # The pool outgrew what the full prompt would cover, so switch to the coarse pass
+                coarse = True
+                batch_size, score_batch = COARSE_BATCH_SIZE, _coarse_score_batch
+                chunk, held = held, []
+            else:
+                chunk.append(paper)
+            while len(chunk) >= batch_size:
+                tasks.append(asyncio.create_task(score_batch(chunk[:batch_size], self.query, sem)))
+                chunk = chunk[batch_size:]
+        if chunk:
+            tasks.append(asyncio.create_task(score_batch(chunk, self.query, sem)))
+        batches = await asyncio.gather(*tasks)
 
+        if held:
+            # The pool never outgrew what would be refined anyway, so no coarse pass was needed
+            return await arerank_papers_with_llm(held, self.query)
+        if keep is None:
+            return _sort_by_score(batches)
+        return await _arefine([paper for batch in batches for paper in batch], self.query, self.top_n)
 
 if __name__ == '__main__':
     # --- Example Usage ---
@@ -1,6 +1,6 @@
 import argparse
-from online_search import search_arxiv
-from llm_handler import expand_query_with_llm, rerank_papers_with_llm
+from online_search import stream_terms
+from llm_handler import expand_query_with_llm, RerankStream
 
 def main():
     # --- 1. Setup Command-Line Argument Parser ---
@@ -22,30 +22,22 @@ def main():
     search_terms = expand_query_with_llm(initial_query)
     print(f"   Expanded search terms: {search_terms}")
     
-    # --- 3. Gather Candidate Papers from arXiv ---
+    # --- 3. Gather Candidate Papers from arXiv and Re-rank them with LLM ---
     print(f"\n📚 Step 2: Gathering candidate papers from arXiv (fetching up to {max_results} for each term)...")
-    candidate_papers = []
-    seen_titles = set()
+    print("🔍 Step 3: Re-ranking papers with LLM for relevance as they arrive...")
+    reranker = RerankStream(initial_query, top_n)
+    stream_terms(search_terms, max_results, reranker.submit,
+                 on_fetched=lambda term, i: print(f"   Fetched results for: '{term}'"))
     
-    for term in search_terms:
-        print(f"   Searching for: '{term}'")
-        papers = search_arxiv(term, max_results=max_results)
-        for paper in papers:
-            if paper['title'] not in seen_titles:
-                candidate_papers.append(paper)
-                seen_titles.add(paper['title'])
+    reranked_papers = reranker.results()
     
-    if not candidate_papers:
+    if not reranked_papers:
         print("\n❌ No papers found after searching with all terms. Please try a different query.")
         return
         
-    print(f"   Found a total of {len(candidate_papers)} unique candidate papers.")
+    print(f"   Ranked a total of {len(reranked_papers)} unique candidate papers.")
     
-    # --- 4. Re-rank Papers with LLM ---
-    print("\n🔍 Step 3: Re-ranking papers with LLM for relevance...")
-    reranked_papers = rerank_papers_with_llm(candidate_papers, initial_query)
-    
-    # --- 5. Display Final Results ---
+    # --- 4. Display Final Results ---
     print(f"\n🏆 Top {top_n} Most Relevant Papers for '{initial_query}':")
     print("=" * 50)
     
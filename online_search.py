@@ -1,5 +1,94 @@
+import os
+import re
+import time
+import queue
+import threading
 import arxiv
-from typing import List, Dict
+import requests
+import diskcache
+from tenacity import retry, wait_exponential_jitter, stop_after_attempt, stop_after_delay, retry_if_exception
+from typing import List, Dict, Iterator, Callable, Optional
+
+# arXiv only publishes new papers once a day, so results are cached on disk for 24 hours
+CACHE_TTL_SECONDS = 24 * 60 * 60
+_cache = diskcache.Cache(os.path.expanduser("~/.cache/arxiv_search"))
+
+# A single client is shared by every search so its requests.Session (and TCP/TLS
+# connection) is reused across calls. Each search only fetches a handful of results,
+# so one page almost always suffices and the inter-page delay is disabled.
+_CLIENT = arxiv.Client(page_size=20, delay_seconds=0.0, num_retries=0)
+
+# No further retries are started after this many seconds
+ARXIV_RETRY_DEADLINE_SECONDS = 30
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, arxiv.HTTPError):
+        # Rate limiting and server-side errors are worth retrying; bad queries are not
+        return exc.status == 429 or exc.status >= 500
+    return isinstance(exc, (arxiv.UnexpectedEmptyPageError, requests.ConnectionError))
+
+# Transient arXiv failures are retried with jittered exponential backoff. This is the
+# only retry layer around arXiv requests (the client above has num_retries=0), so an
+# exception that escapes it is final and callers fall back straight away.
+arxiv_retry = retry(
+    wait=wait_exponential_jitter(1, 10),
+    stop=stop_after_attempt(4) | stop_after_delay(ARXIV_RETRY_DEADLINE_SECONDS),
+    retry=retry_if_exception(_is_transient),
+    reraise=True
+)
+
+def _to_paper(result: arxiv.Result) -> Dict:
+    return {
+        "title": result.title,
+        "authors": [author.name for author in result.authors],
+        "summary": result.summary,
+        "pdf_url": result.pdf_url,
+        # Base arXiv ID without the version suffix, so v1/v2 of a preprint match
+        "arxiv_id": re.sub(r"v\d+$", "", result.get_short_id())
+    }
+
+def iter_arxiv(query: str, max_results: int = 10) -> Iterator[Dict]:
+    """
+    Searches the arXiv API for a given query, yielding papers as each page arrives.
+
+    Cached results are replayed without a network request. Unlike search_arxiv,
+    errors are raised to the caller, which should wrap its consumption of the
+    generator with arxiv_retry.
+
+    Args:
+        query (str): The search query.
+        max_results (int): The maximum number of results to return.
+
+    Yields:
+        Dict: A paper with its title, authors, summary (abstract), pdf_url and arxiv_id.
+    """
+    key = f"{query}|{max_results}"
+    cached = _cache.get(key)
+    if cached is not None:
+        ts, data = cached
+        if time.time() - ts < CACHE_TTL_SECONDS:
+            yield from data
+            return
+
+    search = arxiv.Search(
+        query=query,
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.Relevance
+    )
+
+    results = []
+    for result in _CLIENT.results(search):
+        paper = _to_paper(result)
+        results.append(paper)
+        yield paper
+
+    # Only complete, successful lookups are cached, so errors are retried on the next call
+    _cache[key] = (time.time(), results)
+
+@arxiv_retry
+def _fetch_results(query: str, max_results: int) -> List[Dict]:
+    """Runs an arXiv search, retrying transient API failures with exponential backoff."""
+    return list(iter_arxiv(query, max_results))
 
 def search_arxiv(query: str, max_results: int = 10) -> List[Dict]:
     """
@@ -11,32 +100,83 @@ def search_arxiv(query: str, max_results: int = 10) -> List[Dict]:
 
     Returns:
         List[Dict]: A list of dictionaries, where each dictionary represents a paper
-                    and contains its title, authors, summary (abstract), and pdf_url.
+                    and contains its title, authors, summary (abstract), pdf_url and arxiv_id.
     """
     try:
-        # Search for papers
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.Relevance
-        )
-
-        results = []
-        for result in search.results():
-            paper = {
-                "title": result.title,
-                "authors": [author.name for author in result.authors],
-                "summary": result.summary,
-                "pdf_url": result.pdf_url
-            }
-            results.append(paper)
-        
-        return results
+        return _fetch_results(query, max_results)
 
     except Exception as e:
         print(f"An error occurred while searching arXiv: {e}")
         return []
 
+def paper_key(paper: Dict) -> str:
+    """
+    Returns a key identifying a paper for deduplication.
+
+    Uses the versionless arXiv ID when available, falling back to a
+    whitespace- and case-normalized title.
+    """
+    return paper.get("arxiv_id") or re.sub(r"\s+", " ", paper["title"].lower().strip())
+
+def stream_terms(terms: List[str], max_results: int, submit: Callable[[Dict], None],
+                 overrides: Optional[Dict[str, Callable[[], List[Dict]]]] = None,
+                 on_fetched: Optional[Callable[[str, int], None]] = None) -> int:
+    """
+    Searches arXiv for every term concurrently, handing each unique paper to submit
+    as soon as its page arrives.
+
+    Args:
+        terms (List[str]): The search terms.
+        max_results (int): The maximum number of results to fetch per term.
+        submit (Callable): Called once per unique paper, from a worker thread.
+        overrides (Dict[str, Callable], optional): Per-term sources of papers that were
+            already fetched elsewhere; an empty result falls back to a normal search.
+        on_fetched (Callable, optional): Called with each term and the number of terms
+            done so far as each search finishes.
+
+    Returns:
+        int: The number of unique papers submitted.
+    """
+    overrides = overrides or {}
+    seen_ids = set()
+    seen_lock = threading.Lock()
+
+    @arxiv_retry
+    def fetch(term):
+        # A retry re-yields papers already submitted, which the dedup below absorbs
+        override = overrides.get(term)
+        papers = (override and override()) or iter_arxiv(term, max_results)
+        for paper in papers:
+            key = paper_key(paper)
+            with seen_lock:
+                if key in seen_ids:
+                    continue
+                seen_ids.add(key)
+            submit(paper)
+
+    slots = threading.BoundedSemaphore(8)
+    done = queue.Queue()
+
+    def gather(term):
+        try:
+            with slots:
+                fetch(term)
+        except Exception as e:
+            print(f"An error occurred while searching arXiv for '{term}': {e}")
+        finally:
+            done.put(term)
+
+    # arXiv requests are blocking I/O, so the terms are fanned out across threads.
+    # They are daemon threads (unlike ThreadPoolExecutor workers) so an in-flight
+    # search never keeps the process alive after its front end exits.
+    for term in terms:
+        threading.Thread(target=gather, args=(term,), daemon=True).start()
+    for i in range(1, len(terms) + 1):
+        term = done.get()
+        if on_fetched is not None:
+            on_fetched(term, i)
+    return len(seen_ids)
+
 if __name__ == '__main__':
     # Example usage:
     test_query = "DDIM inversion for image editing"